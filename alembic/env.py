@@ -0,0 +1,59 @@
+"""
+Alembic migration environment for the Economic Agency Index Dashboard.
+"""
+
+import os
+from logging.config import fileConfig
+
+from alembic import context
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+from app.models.eai import Base
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+def get_database_url() -> str:
+    """Get database URL from environment variables."""
+    load_dotenv()
+    
+    required_vars = ['DB_HOST', 'DB_PORT', 'DB_NAME', 'DB_USER', 'DB_PASSWORD']
+    missing_vars = [var for var in required_vars if not os.getenv(var)]
+    
+    if missing_vars:
+        raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+    
+    return f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+
+def run_migrations_offline():
+    """Emit migration SQL without connecting to the database."""
+    context.configure(
+        url=get_database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    """Run migrations against a live database connection."""
+    engine = create_engine(get_database_url())
+    
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        
+        with context.begin_transaction():
+            context.run_migrations()
+    
+    engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,34 @@
+"""Add year-leading composite index on eai_scores
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-15
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "idx_eai_year_fips",
+            "eai_scores",
+            ["year", "fips"],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "idx_eai_year_fips",
+            table_name="eai_scores",
+            postgresql_concurrently=True,
+            if_exists=True
+        )
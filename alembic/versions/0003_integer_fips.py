@@ -0,0 +1,26 @@
+"""Store county FIPS codes as integers
+
+Revision ID: 0003
+Revises: 0001
+Create Date: 2026-10-15
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.drop_constraint("eai_scores_fips_fkey", "eai_scores", type_="foreignkey")
+    op.execute("ALTER TABLE counties ALTER COLUMN fips TYPE integer USING fips::integer")
+    op.execute("ALTER TABLE eai_scores ALTER COLUMN fips TYPE integer USING fips::integer")
+    op.create_foreign_key("eai_scores_fips_fkey", "eai_scores", "counties", ["fips"], ["fips"])
+
+def downgrade():
+    op.drop_constraint("eai_scores_fips_fkey", "eai_scores", type_="foreignkey")
+    op.execute("ALTER TABLE eai_scores ALTER COLUMN fips TYPE varchar(5) USING lpad(fips::text, 5, '0')")
+    op.execute("ALTER TABLE counties ALTER COLUMN fips TYPE varchar(5) USING lpad(fips::text, 5, '0')")
+    op.create_foreign_key("eai_scores_fips_fkey", "eai_scores", "counties", ["fips"], ["fips"])
@@ -0,0 +1,41 @@
+"""Replace year indexes on eai_scores with a covering index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-15
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+COVERED_COLUMNS = ["eai_score", "earned_share", "property_share", "transfer_share", "total_income"]
+
+def upgrade():
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "idx_eai_year_fips_cov",
+            "eai_scores",
+            ["year", "fips"],
+            postgresql_include=COVERED_COLUMNS,
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        op.drop_index("idx_eai_year_fips", table_name="eai_scores",
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index("idx_eai_year", table_name="eai_scores",
+                      postgresql_concurrently=True, if_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("idx_eai_year", "eai_scores", ["year"],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index("idx_eai_year_fips", "eai_scores", ["year", "fips"],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index("idx_eai_year_fips_cov", table_name="eai_scores",
+                      postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,88 @@
+"""Partition eai_scores by year
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-15
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "id, fips, year, earned_income, property_income, transfers, total_income, "
+    "eai_score, earned_share, property_share, transfer_share, created_at, updated_at"
+)
+COVERED_COLUMNS = ["eai_score", "earned_share", "property_share", "transfer_share", "total_income"]
+
+def create_scores_table(**kwargs):
+    """Create eai_scores with its indexes, reusing the existing id sequence."""
+    op.create_table(
+        "eai_scores",
+        sa.Column("id", sa.Integer, nullable=False,
+                  server_default=sa.text("nextval('eai_scores_id_seq')")),
+        sa.Column("fips", sa.Integer, sa.ForeignKey("counties.fips", name="eai_scores_fips_fkey"),
+                  nullable=False),
+        sa.Column("year", sa.Integer, nullable=False),
+        sa.Column("earned_income", sa.Float, nullable=False),
+        sa.Column("property_income", sa.Float, nullable=False),
+        sa.Column("transfers", sa.Float, nullable=False),
+        sa.Column("total_income", sa.Float, nullable=False),
+        sa.Column("eai_score", sa.Float, nullable=False),
+        sa.Column("earned_share", sa.Float, nullable=False),
+        sa.Column("property_share", sa.Float, nullable=False),
+        sa.Column("transfer_share", sa.Float, nullable=False),
+        sa.Column("created_at", sa.Date),
+        sa.Column("updated_at", sa.Date),
+        **kwargs
+    )
+    op.create_index("idx_eai_fips_year", "eai_scores", ["fips", "year"], unique=True)
+    op.create_index("idx_eai_year_fips_cov", "eai_scores", ["year", "fips"],
+                    postgresql_include=COVERED_COLUMNS)
+
+def detach_old_table(name):
+    """Rename eai_scores out of the way and free its constraint and index names."""
+    op.execute(f"ALTER TABLE eai_scores RENAME TO {name}")
+    op.execute(f"ALTER TABLE {name} DROP CONSTRAINT eai_scores_pkey")
+    op.execute(f"ALTER TABLE {name} DROP CONSTRAINT eai_scores_fips_fkey")
+    op.execute("DROP INDEX idx_eai_fips_year")
+    op.execute("DROP INDEX idx_eai_year_fips_cov")
+
+def copy_and_drop(name):
+    """Move rows from the detached table into eai_scores and drop it."""
+    op.execute(f"INSERT INTO eai_scores ({COLUMNS}) SELECT {COLUMNS} FROM {name}")
+    # Keep the sequence alive when the old table is dropped
+    op.execute("ALTER SEQUENCE eai_scores_id_seq OWNED BY eai_scores.id")
+    op.execute(f"DROP TABLE {name}")
+
+def upgrade():
+    detach_old_table("eai_scores_unpartitioned")
+    create_scores_table(
+        sa.PrimaryKeyConstraint("id", "year", name="eai_scores_pkey"),
+        postgresql_partition_by="RANGE (year)"
+    )
+    op.execute("CREATE TABLE eai_scores_default PARTITION OF eai_scores DEFAULT")
+    op.execute("""
+        DO $$
+        DECLARE y integer;
+        BEGIN
+            FOR y IN SELECT DISTINCT year FROM eai_scores_unpartitioned LOOP
+                EXECUTE format(
+                    'CREATE TABLE eai_scores_%s PARTITION OF eai_scores FOR VALUES FROM (%s) TO (%s)',
+                    y, y, y + 1
+                );
+            END LOOP;
+        END $$
+    """)
+    copy_and_drop("eai_scores_unpartitioned")
+
+def downgrade():
+    detach_old_table("eai_scores_partitioned")
+    create_scores_table(sa.PrimaryKeyConstraint("id", name="eai_scores_pkey"))
+    # Dropping the parent drops every partition with it
+    copy_and_drop("eai_scores_partitioned")
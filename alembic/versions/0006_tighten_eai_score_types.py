@@ -0,0 +1,34 @@
+"""Store EAI shares as real and incomes as numeric(14,2)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-15
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+INCOME_COLUMNS = ["earned_income", "property_income", "transfers", "total_income"]
+SCORE_COLUMNS = ["eai_score", "earned_share", "property_share", "transfer_share"]
+
+def alter_types(column_types):
+    """Change column types in a single rewrite; partitions follow the parent."""
+    clauses = ", ".join(
+        f"ALTER COLUMN {column} TYPE {type_} USING {column}::{type_}"
+        for column, type_ in column_types.items()
+    )
+    op.execute(f"ALTER TABLE eai_scores {clauses}")
+
+def upgrade():
+    alter_types({
+        **{column: "numeric(14,2)" for column in INCOME_COLUMNS},
+        **{column: "real" for column in SCORE_COLUMNS}
+    })
+
+def downgrade():
+    alter_types({column: "double precision" for column in INCOME_COLUMNS + SCORE_COLUMNS})
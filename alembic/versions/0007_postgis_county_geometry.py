@@ -0,0 +1,29 @@
+"""Store county boundaries as PostGIS geometry
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-15
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+    op.execute(
+        "ALTER TABLE counties ALTER COLUMN geometry TYPE geometry(GEOMETRY, 4326) "
+        "USING ST_SetSRID(ST_GeomFromGeoJSON(geometry), 4326)"
+    )
+    op.create_index("idx_counties_geometry", "counties", ["geometry"], postgresql_using="gist")
+
+def downgrade():
+    op.drop_index("idx_counties_geometry", table_name="counties")
+    op.execute(
+        "ALTER TABLE counties ALTER COLUMN geometry TYPE varchar "
+        "USING ST_AsGeoJSON(geometry)"
+    )
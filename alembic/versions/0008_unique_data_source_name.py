@@ -0,0 +1,28 @@
+"""Keep one data_sources row per source
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-15
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Keep the latest status row for each source before enforcing uniqueness
+    op.execute("""
+        DELETE FROM data_sources a
+        USING data_sources b
+        WHERE a.source_name = b.source_name AND a.id < b.id
+    """)
+    op.drop_index("idx_source_name", table_name="data_sources")
+    op.create_index("idx_source_name", "data_sources", ["source_name"], unique=True)
+
+def downgrade():
+    op.drop_index("idx_source_name", table_name="data_sources")
+    op.create_index("idx_source_name", "data_sources", ["source_name"])
@@ -3,14 +3,20 @@ Database connection module for the Economic Agency Index Dashboard.
 """
 
 import os
-from typing import Generator
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from pathlib import Path
+from typing import AsyncGenerator
+import yaml
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Load configuration
+project_root = Path(__file__).parent.parent.parent
+with open(project_root / "config.yaml") as f:
+    db_config = yaml.safe_load(f)["database"]
+
 # Get database URL from environment variables
 def get_database_url() -> str:
     """Get database URL from environment variables."""
@@ -20,23 +26,31 @@ def get_database_url() -> str:
     if missing_vars:
         raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
     
-    return f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+    return f"postgresql+asyncpg://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
 
-# Create database engine
-engine = create_engine(
+# Create database engine. The pool should cover the expected number of
+# concurrent in-flight requests (pool_size + max_overflow). Environment
+# variables override the config.yaml values.
+engine = create_async_engine(
     get_database_url(),
-    pool_size=5,
-    max_overflow=10,
-    pool_pre_ping=True
+    pool_size=int(os.getenv("DB_POOL_SIZE", db_config["pool_size"])),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", db_config["max_overflow"])),
+    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", db_config["pool_recycle"])),
+    pool_pre_ping=True,
+    connect_args={
+        # Keep idle connections alive through NATs and load balancers
+        "server_settings": {
+            "tcp_keepalives_idle": "30",
+            "tcp_keepalives_interval": "10",
+            "tcp_keepalives_count": "5"
+        }
+    }
 )
 
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-def get_db() -> Generator[Session, None, None]:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Get database session."""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close() 
\ No newline at end of file
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
@@ -3,34 +3,108 @@ FastAPI backend for the Economic Agency Index Dashboard.
 """
 
 import os
+import csv
+import io
+import hashlib
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from datetime import datetime
-from fastapi import FastAPI, HTTPException, Query, Depends
+from datetime import datetime, timezone
+from fastapi import FastAPI, HTTPException, Query, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-import pandas as pd
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.decorator import cache
+from redis import asyncio as aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import JSON, String, cast, func, select
 import geopandas as gpd
 from dotenv import load_dotenv
 import yaml
 from pathlib import Path
 
 from app.models.eai import County, EAIScore, EAIMetadata
-from app.api.database import get_db, engine
+from app.api.database import get_db, engine, AsyncSessionLocal
 
 # Load configuration
 project_root = Path(__file__).parent.parent.parent
 with open(project_root / "config.yaml") as f:
     config = yaml.safe_load(f)
 
+# Column order for CSV downloads
+DOWNLOAD_COLUMNS = [
+    "fips", "county", "state", "year", "eai_score",
+    "earned_share", "property_share", "transfer_share", "total_income"
+]
+
+# Number of rows fetched per round-trip when streaming downloads
+DOWNLOAD_BATCH_SIZE = 1000
+
+# Cache lifetimes for read-only endpoints
+REFERENCE_CACHE_TTL = config["api"]["reference_cache_ttl"]
+CACHE_TTL = config["api"]["cache_ttl"]
+
+# Read-only routes that answer conditional GETs
+ETAG_PATH_PREFIXES = ("/counties", "/states", "/years", "/metadata/year/", "/eai/year/")
+ETAG_CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=86400"
+
+# Lookups precomputed by the processing pipeline
+PRECOMPUTED_KEYS = config["api"]["precomputed_keys"]
+
+# Redis prefix for cached responses, shared with the pipeline that clears it
+RESPONSE_CACHE_PREFIX = config["api"]["response_cache_prefix"]
+
+redis_client = aioredis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+
+def cache_key_builder(func, namespace: str = "", *, request=None, response=None,
+                      args=(), kwargs=None) -> str:
+    """Build a cache key from the route and its query parameters."""
+    # The database session differs on every request and must not be hashed
+    params = sorted((k, v) for k, v in (kwargs or {}).items() if k != "db")
+    key = hashlib.md5(f"{func.__module__}:{func.__name__}:{params}".encode()).hexdigest()
+    return f"{namespace}:{key}"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up the Redis response cache for the lifetime of the app."""
+    FastAPICache.init(RedisBackend(redis_client), prefix=RESPONSE_CACHE_PREFIX, key_builder=cache_key_builder)
+    yield
+    await redis_client.close()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Economic Agency Index API",
     description="API for the Economic Agency Index Dashboard",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# Configure CORS
+@app.middleware("http")
+async def add_etag_headers(request: Request, call_next):
+    """Tag read-only responses with the pipeline run that produced the data."""
+    if request.method != "GET" or not request.url.path.startswith(ETAG_PATH_PREFIXES):
+        return await call_next(request)
+    
+    # Published by the pipeline after it clears the response cache, so an
+    # ETag never pairs a new run with a body cached from an older one
+    completed_at = await redis_client.get(PRECOMPUTED_KEYS["completed_at"])
+    if completed_at is None:
+        return await call_next(request)
+    
+    # Set after the response cache runs, so this ETag is the one clients see
+    route = hashlib.md5(f"{request.url.path}?{request.url.query}".encode()).hexdigest()
+    etag = f'W/"{completed_at.decode()}-{route}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
+    return response
+
+# Configure CORS (added last so it also wraps 304 responses)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=config["api"]["cors_origins"],
@@ -39,6 +113,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def request_time() -> datetime:
+    """Get the current UTC time once per request."""
+    return datetime.now(timezone.utc)
+
+def check_end_year(end_year: Optional[int], now: datetime):
+    """Reject end years past the current year."""
+    if end_year and end_year > now.year:
+        raise HTTPException(status_code=400, detail=f"end_year must not be later than {now.year}")
+
+def parse_fips(fips: str) -> int:
+    """Convert a FIPS path parameter to the integer key stored in the database."""
+    if not fips.isdigit() or len(fips) > 5:
+        raise HTTPException(status_code=400, detail="FIPS code must be up to 5 digits")
+    return int(fips)
+
+def padded_fips(column):
+    """Select an integer FIPS column as the zero-padded 5-digit code."""
+    return func.lpad(cast(column, String), 5, "0").label("fips")
+
 @app.get("/")
 async def root():
     """Root endpoint returning API information."""
@@ -49,193 +142,262 @@ async def root():
     }
 
 @app.get("/counties")
+@cache(expire=REFERENCE_CACHE_TTL)
 async def get_counties(
     state: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get list of counties with optional state filter."""
-    query = db.query(County)
+    stmt = select(
+        padded_fips(County.fips),
+        County.name,
+        County.state,
+        func.json_build_object(
+            "lat", County.centroid_lat,
+            "lon", County.centroid_lon,
+            type_=JSON
+        ).label("centroid")
+    )
     if state:
-        query = query.filter(County.state == state)
-    
-    counties = query.all()
-    return [
-        {
-            "fips": c.fips,
-            "name": c.name,
-            "state": c.state,
-            "centroid": {"lat": c.centroid_lat, "lon": c.centroid_lon}
-        }
-        for c in counties
-    ]
+        stmt = stmt.where(County.state == state)
+    
+    result = await db.execute(stmt)
+    return result.mappings().all()
 
 @app.get("/eai/{fips}")
 async def get_county_eai(
     fips: str,
     start_year: Optional[int] = Query(None, ge=1990),
-    end_year: Optional[int] = Query(None, le=datetime.now().year),
-    db: Session = Depends(get_db)
+    end_year: Optional[int] = Query(None),
+    now: datetime = Depends(request_time),
+    db: AsyncSession = Depends(get_db)
 ):
     """Get EAI scores for a specific county."""
-    query = db.query(EAIScore).filter(EAIScore.fips == fips)
+    check_end_year(end_year, now)
+    
+    stmt = select(
+        EAIScore.year,
+        EAIScore.eai_score,
+        EAIScore.earned_share,
+        EAIScore.property_share,
+        EAIScore.transfer_share,
+        EAIScore.total_income
+    ).where(
+        EAIScore.fips == parse_fips(fips)
+    )
     
     if start_year:
-        query = query.filter(EAIScore.year >= start_year)
+        stmt = stmt.where(EAIScore.year >= start_year)
     if end_year:
-        query = query.filter(EAIScore.year <= end_year)
+        stmt = stmt.where(EAIScore.year <= end_year)
     
-    scores = query.order_by(EAIScore.year).all()
+    result = await db.execute(stmt.order_by(EAIScore.year))
+    scores = result.mappings().all()
     
     if not scores:
         raise HTTPException(status_code=404, detail="County not found or no data available")
     
-    return [
-        {
-            "year": s.year,
-            "eai_score": s.eai_score,
-            "earned_share": s.earned_share,
-            "property_share": s.property_share,
-            "transfer_share": s.transfer_share,
-            "total_income": s.total_income
-        }
-        for s in scores
-    ]
+    return scores
 
 @app.get("/eai/year/{year}")
+@cache(expire=CACHE_TTL)
 async def get_year_eai(
     year: int,
     state: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get EAI scores for all counties in a specific year."""
-    query = db.query(
-        EAIScore, County
+    stmt = select(
+        padded_fips(EAIScore.fips),
+        County.name,
+        County.state,
+        EAIScore.eai_score,
+        EAIScore.earned_share,
+        EAIScore.property_share,
+        EAIScore.transfer_share,
+        EAIScore.total_income
     ).join(
         County, EAIScore.fips == County.fips
-    ).filter(
+    ).where(
         EAIScore.year == year
     )
     
     if state:
-        query = query.filter(County.state == state)
+        stmt = stmt.where(County.state == state)
     
-    results = query.all()
+    result = await db.execute(stmt)
+    results = result.mappings().all()
     
     if not results:
         raise HTTPException(status_code=404, detail="No data available for specified year")
     
-    return [
-        {
-            "fips": r.EAIScore.fips,
-            "name": r.County.name,
-            "state": r.County.state,
-            "eai_score": r.EAIScore.eai_score,
-            "earned_share": r.EAIScore.earned_share,
-            "property_share": r.EAIScore.property_share,
-            "transfer_share": r.EAIScore.transfer_share,
-            "total_income": r.EAIScore.total_income,
-            "geometry": r.County.geometry
-        }
-        for r in results
-    ]
+    return results
+
+@app.get("/geometry")
+async def get_counties_geojson():
+    """Get simplified boundaries for all counties as a GeoJSON FeatureCollection."""
+    geojson_path = (
+        project_root / config["processing"]["processed_dir"] / config["processing"]["counties_geojson"]
+    )
+    if not geojson_path.exists():
+        raise HTTPException(status_code=404, detail="County boundaries have not been processed")
+    
+    return FileResponse(
+        geojson_path,
+        media_type="application/geo+json",
+        headers={"Cache-Control": f"public, max-age={REFERENCE_CACHE_TTL}"}
+    )
+
+@app.get("/geometry/{fips}")
+async def get_county_geometry(
+    fips: str,
+    response: Response,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the boundary geometry for a specific county."""
+    result = await db.execute(
+        select(
+            padded_fips(County.fips),
+            func.ST_AsGeoJSON(County.geometry).label("geometry")
+        ).where(
+            County.fips == parse_fips(fips)
+        )
+    )
+    geometry = result.mappings().first()
+    
+    if not geometry:
+        raise HTTPException(status_code=404, detail="County not found")
+    
+    # Boundaries are static between pipeline runs
+    response.headers["Cache-Control"] = f"public, max-age={REFERENCE_CACHE_TTL}"
+    return geometry
 
 @app.get("/metadata/year/{year}")
+@cache(expire=CACHE_TTL)
 async def get_year_metadata(
     year: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get metadata for a specific year's EAI calculations."""
-    metadata = db.query(EAIMetadata).filter(EAIMetadata.year == year).first()
+    result = await db.execute(
+        select(
+            EAIMetadata.year,
+            EAIMetadata.calculation_date,
+            EAIMetadata.mean_earned,
+            EAIMetadata.mean_property,
+            EAIMetadata.mean_transfer,
+            EAIMetadata.std_earned,
+            EAIMetadata.std_property,
+            EAIMetadata.std_transfer,
+            EAIMetadata.total_counties
+        ).where(
+            EAIMetadata.year == year
+        )
+    )
+    metadata = result.mappings().first()
     
     if not metadata:
         raise HTTPException(status_code=404, detail="No metadata available for specified year")
     
-    return {
-        "year": metadata.year,
-        "calculation_date": metadata.calculation_date,
-        "mean_earned": metadata.mean_earned,
-        "mean_property": metadata.mean_property,
-        "mean_transfer": metadata.mean_transfer,
-        "std_earned": metadata.std_earned,
-        "std_property": metadata.std_property,
-        "std_transfer": metadata.std_transfer,
-        "total_counties": metadata.total_counties
-    }
+    return metadata
 
 @app.get("/states")
-async def get_states(db: Session = Depends(get_db)):
+async def get_states(db: AsyncSession = Depends(get_db)):
     """Get list of states with county counts."""
-    states = db.query(
-        County.state,
-        func.count(County.fips).label("county_count")
-    ).group_by(
-        County.state
-    ).all()
-    
-    return [
-        {
-            "state": s.state,
-            "county_count": s.county_count
-        }
-        for s in states
-    ]
+    precomputed = await redis_client.get(PRECOMPUTED_KEYS["states"])
+    if precomputed:
+        return Response(content=precomputed, media_type="application/json")
+    
+    # Fall back to aggregating when the pipeline has not published yet
+    result = await db.execute(
+        select(
+            County.state,
+            func.count(County.fips).label("county_count")
+        ).group_by(
+            County.state
+        ).order_by(
+            County.state
+        )
+    )
+    
+    return result.mappings().all()
 
 @app.get("/years")
-async def get_available_years(db: Session = Depends(get_db)):
+async def get_available_years(db: AsyncSession = Depends(get_db)):
     """Get list of years with available data."""
-    years = db.query(
-        EAIScore.year
-    ).distinct().order_by(
-        EAIScore.year
-    ).all()
+    precomputed = await redis_client.get(PRECOMPUTED_KEYS["years"])
+    if precomputed:
+        return Response(content=precomputed, media_type="application/json")
     
-    return [y.year for y in years]
+    result = await db.execute(
+        select(
+            EAIScore.year
+        ).distinct().order_by(
+            EAIScore.year
+        )
+    )
+    
+    return result.scalars().all()
 
 @app.get("/download/eai")
 async def download_eai_data(
     start_year: Optional[int] = Query(None, ge=1990),
-    end_year: Optional[int] = Query(None, le=datetime.now().year),
+    end_year: Optional[int] = Query(None),
+    now: datetime = Depends(request_time),
     state: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Download EAI data as CSV."""
-    query = db.query(
-        EAIScore, County
+    """Download EAI data as a streamed CSV."""
+    check_end_year(end_year, now)
+    
+    stmt = select(
+        padded_fips(EAIScore.fips),
+        County.name,
+        County.state,
+        EAIScore.year,
+        EAIScore.eai_score,
+        EAIScore.earned_share,
+        EAIScore.property_share,
+        EAIScore.transfer_share,
+        EAIScore.total_income
     ).join(
         County, EAIScore.fips == County.fips
     )
     
     if start_year:
-        query = query.filter(EAIScore.year >= start_year)
+        stmt = stmt.where(EAIScore.year >= start_year)
     if end_year:
-        query = query.filter(EAIScore.year <= end_year)
+        stmt = stmt.where(EAIScore.year <= end_year)
     if state:
-        query = query.filter(County.state == state)
-    
-    results = query.all()
+        stmt = stmt.where(County.state == state)
     
-    if not results:
+    if not await db.scalar(select(stmt.exists())):
         raise HTTPException(status_code=404, detail="No data available for specified parameters")
     
-    # Convert to DataFrame
-    data = []
-    for r in results:
-        data.append({
-            "fips": r.EAIScore.fips,
-            "county": r.County.name,
-            "state": r.County.state,
-            "year": r.EAIScore.year,
-            "eai_score": r.EAIScore.eai_score,
-            "earned_share": r.EAIScore.earned_share,
-            "property_share": r.EAIScore.property_share,
-            "transfer_share": r.EAIScore.transfer_share,
-            "total_income": r.EAIScore.total_income
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # Return as CSV
-    return {
-        "filename": f"eai_data_{datetime.now().strftime('%Y%m%d')}.csv",
-        "content": df.to_csv(index=False)
-    } 
\ No newline at end of file
+    async def generate_csv():
+        # The request-scoped session is closed before the response body is
+        # sent, so the stream owns its own session and server-side cursor.
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(DOWNLOAD_COLUMNS)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(
+                stmt.execution_options(yield_per=DOWNLOAD_BATCH_SIZE)
+            )
+            async for rows in result.partitions():
+                # Columns are selected in DOWNLOAD_COLUMNS order
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+    
+    filename = f"eai_data_{now.strftime('%Y%m%d')}.csv"
+    return StreamingResponse(
+        generate_csv(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -7,12 +7,22 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import io
+import hashlib
+import orjson
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from datetime import datetime
+from typing import Optional
 import yaml
 from pathlib import Path
 import altair as alt
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
 
 # Load configuration
 project_root = Path(__file__).parent.parent.parent
@@ -20,7 +30,20 @@ with open(project_root / "config.yaml") as f:
     config = yaml.safe_load(f)
 
 # API configuration
-API_BASE_URL = f"http://localhost:{config['api']['api_port']}"
+API_BASE_URL = f"http://localhost:{config['app']['api_port']}"
+# Browser-facing API address, for URLs the viewer's browser requests itself
+API_PUBLIC_URL = config['api']['public_url'].rstrip('/')
+API_TIMEOUT = 10  # seconds
+
+# Shared keep-alive session so reruns reuse pooled API connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
 
 # Page configuration
 st.set_page_config(
@@ -49,90 +72,207 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Helper functions
+@st.cache_data(ttl=300, show_spinner=False)
+def get_api_json(endpoint: str, query: tuple):
+    """Fetch JSON from the API, cached by endpoint and query parameters."""
+    response = SESSION.get(f"{API_BASE_URL}/{endpoint}", params=dict(query), timeout=API_TIMEOUT)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame to CSV with Arrow's native writer."""
+    buf = io.BytesIO()
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buf)
+    return buf.getvalue()
+
+def build_query(params: dict = None) -> tuple:
+    """Build hashable query parameters, dropping unset filters."""
+    # Equivalent requests then share a cache entry
+    return tuple(sorted((k, v) for k, v in (params or {}).items() if v is not None))
+
 def fetch_api_data(endpoint: str, params: dict = None) -> dict:
     """Fetch data from the API."""
     try:
-        response = requests.get(f"{API_BASE_URL}/{endpoint}", params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        return get_api_json(endpoint, build_query(params))
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         st.error(f"Error fetching data: {e}")
         return None
 
-def create_choropleth_map(data: list, year: int) -> go.Figure:
-    """Create a choropleth map of EAI scores."""
-    # Convert data to DataFrame
-    df = pd.DataFrame(data)
+def fetch_many(calls: list) -> list:
+    """Fetch several independent (endpoint, params) pairs from the API concurrently."""
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=len(calls),
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+    ) as executor:
+        futures = [
+            executor.submit(get_api_json, endpoint, build_query(params))
+            for endpoint, params in calls
+        ]
+    
+    # Report failures from the script thread so they render
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+            st.error(f"Error fetching data: {e}")
+            results.append(None)
+    return results
+
+@st.cache_resource(ttl=config['api']['reference_cache_ttl'], show_spinner=False)
+def get_mapped_fips() -> frozenset:
+    """Fetch the FIPS codes that have boundaries in the county GeoJSON."""
+    response = SESSION.get(f"{API_BASE_URL}/geometry", timeout=API_TIMEOUT)
+    response.raise_for_status()
+    return frozenset(feature['id'] for feature in orjson.loads(response.content)['features'])
+
+def load_mapped_fips() -> Optional[frozenset]:
+    """Load the mapped FIPS codes, or None if the boundaries are unavailable."""
+    try:
+        return get_mapped_fips()
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError, KeyError) as e:
+        st.warning(f"County boundaries unavailable; the map may be incomplete: {e}")
+        return None
+
+# Narrow dtypes for charted columns; halves the data serialized into figures
+CHART_DTYPES = {
+    'year': 'int16',
+    'eai_score': 'float32',
+    'earned_share': 'float32',
+    'property_share': 'float32',
+    'transfer_share': 'float32'
+}
+
+def downcast_chart_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast the charted columns present in a DataFrame to compact dtypes."""
+    return df.astype({col: dtype for col, dtype in CHART_DTYPES.items() if col in df})
+
+def stepped_color_scale(colors: list) -> list:
+    """Build a continuous color scale with one flat band per color."""
+    n = len(colors)
+    return [
+        [edge / n, color]
+        for i, color in enumerate(colors)
+        for edge in (i, i + 1)
+    ]
+
+def payload_digest(df: pd.DataFrame) -> str:
+    """Short hash of a DataFrame's values, for keying memoized figures."""
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values).hexdigest()[:12]
+
+@st.cache_resource(ttl=config['api']['cache_ttl'])
+def create_choropleth_map(_df: pd.DataFrame, _mapped_fips: Optional[frozenset],
+                          data_digest: str, filtered: bool,
+                          year: int, state: str) -> go.Figure:
+    """Create a choropleth map of EAI scores, memoized per payload, year and state."""
+    # The underscored arguments are unhashed, so the payload digest and whether
+    # the FIPS filter applied key the cache; new scores then build a new figure
+    df = downcast_chart_columns(_df)
+    # Drop counties the map cannot draw
+    if _mapped_fips is not None:
+        df = df[df['fips'].isin(_mapped_fips)]
+    
+    map_config = config['visualization']['map']
+    hover_data = {
+        'name': True,
+        'state': True,
+        'eai_score': ':.2f',
+        'earned_share': ':.1%',
+        'property_share': ':.1%',
+        'transfer_share': ':.1%'
+    }
+    
+    # Categorical buckets are coded as integers on a stepped continuous
+    # scale; Plotly's discrete color path is far slower for choropleths
+    bins = map_config.get('bins')
+    if bins:
+        # n edges cut the scores into n + 1 buckets, each with a color and label
+        if not len(bins['colors']) == len(bins['edges']) + 1 == len(bins['labels']):
+            raise ValueError(
+                "visualization.map.bins needs one more color and label than edges; got "
+                f"{len(bins['edges'])} edges, {len(bins['colors'])} colors, {len(bins['labels'])} labels"
+            )
+        # digitize puts NaN past the last edge, so missing scores are masked
+        # back to NaN and left uncolored rather than shown in the top bucket
+        df = df.assign(
+            eai_bucket=np.where(
+                df['eai_score'].isna(), np.nan, np.digitize(df['eai_score'], bins['edges'])
+            ).astype('float32')
+        )
+        color = 'eai_bucket'
+        color_scale = stepped_color_scale(bins['colors'])
+        color_range = (-0.5, len(bins['colors']) - 0.5)
+        hover_data['eai_bucket'] = False
+    else:
+        color = 'eai_score'
+        color_scale = map_config['colors']
+        color_range = (-2, 2)  # Adjust based on your data
     
-    # Create the choropleth map
-    fig = px.choropleth(
+    # Create the choropleth map; mapbox traces are drawn with WebGL
+    fig = px.choropleth_mapbox(
         df,
-        geojson=json.loads(df['geometry'].iloc[0]),  # Use first geometry as template
+        # The browser fetches and caches the boundaries instead of each
+        # figure embedding the full FeatureCollection
+        geojson=f"{API_PUBLIC_URL}/geometry",
         locations='fips',
-        color='eai_score',
-        color_continuous_scale=config['visualization']['map']['colors'],
-        range_color=(-2, 2),  # Adjust based on your data
-        scope="usa",
+        color=color,
+        color_continuous_scale=color_scale,
+        range_color=color_range,
+        mapbox_style=map_config['style'],
+        center={"lat": map_config['center'][0], "lon": map_config['center'][1]},
+        zoom=map_config['zoom'],
+        opacity=map_config['opacity'],
         title=f"Economic Agency Index - {year}",
-        labels={'eai_score': 'EAI Score'},
-        hover_data={
-            'name': True,
-            'state': True,
-            'eai_score': ':.2f',
-            'earned_share': ':.1%',
-            'property_share': ':.1%',
-            'transfer_share': ':.1%'
-        }
+        labels={'eai_score': 'EAI Score', 'eai_bucket': 'EAI Score'},
+        hover_data=hover_data
     )
     
     # Update layout
     fig.update_layout(
-        geo=dict(
-            showlakes=True,
-            lakecolor='rgb(255, 255, 255)',
-            showsubunits=True,
-            subunitcolor='rgb(217, 217, 217)',
-        ),
         margin={"r":0,"t":30,"l":0,"b":0},
-        height=600
+        height=600,
+        uirevision="eai"  # keep pan/zoom across reruns
     )
+    if bins:
+        fig.update_coloraxes(colorbar=dict(
+            tickvals=list(range(len(bins['colors']))),
+            ticktext=bins['labels']
+        ))
     
     return fig
 
-def create_time_series(data: list, county_name: str) -> go.Figure:
-    """Create a time series plot of EAI components."""
-    df = pd.DataFrame(data)
-    
-    fig = go.Figure()
-    
-    # Add traces for each component
-    fig.add_trace(go.Scatter(
-        x=df['year'],
-        y=df['earned_share'],
-        name='Earned Income',
-        line=dict(color='#2ecc71')
-    ))
-    
-    fig.add_trace(go.Scatter(
-        x=df['year'],
-        y=df['property_share'],
-        name='Property Income',
-        line=dict(color='#3498db')
-    ))
-    
-    fig.add_trace(go.Scatter(
-        x=df['year'],
-        y=df['transfer_share'],
-        name='Transfers',
-        line=dict(color='#e74c3c')
-    ))
+# Time series columns mapped to their legend names and line colors
+TIME_SERIES_COMPONENTS = {
+    'earned_share': ('Earned Income', '#2ecc71'),
+    'property_share': ('Property Income', '#3498db'),
+    'transfer_share': ('Transfers', '#e74c3c'),
+    'eai_score': ('EAI Score', '#2c3e50')
+}
+
+@st.cache_resource(ttl=config['api']['cache_ttl'])
+def create_time_series(_df: pd.DataFrame, data_digest: str, county_name: str) -> go.Figure:
+    """Create a time series plot of EAI components, memoized per county and payload."""
+    # One long-form frame so all components are built in a single px.line call
+    df_long = downcast_chart_columns(_df).melt(
+        id_vars='year',
+        value_vars=list(TIME_SERIES_COMPONENTS),
+        var_name='component',
+        value_name='value'
+    )
+    df_long['component'] = df_long['component'].map(
+        {col: name for col, (name, _) in TIME_SERIES_COMPONENTS.items()}
+    )
     
-    fig.add_trace(go.Scatter(
-        x=df['year'],
-        y=df['eai_score'],
-        name='EAI Score',
-        line=dict(color='#2c3e50', width=2)
-    ))
+    fig = px.line(
+        df_long,
+        x='year',
+        y='value',
+        color='component',
+        color_discrete_map={name: color for name, color in TIME_SERIES_COMPONENTS.values()},
+        labels={'component': ''}
+    )
+    fig.update_traces(line_width=2, selector=dict(name='EAI Score'))
     
     # Update layout
     fig.update_layout(
@@ -140,7 +280,8 @@ def create_time_series(data: list, county_name: str) -> go.Figure:
         xaxis_title="Year",
         yaxis_title="Share / Score",
         hovermode="x unified",
-        height=400
+        height=400,
+        uirevision="eai"
     )
     
     return fig
@@ -149,8 +290,10 @@ def create_time_series(data: list, county_name: str) -> go.Figure:
 st.sidebar.title("Economic Agency Index Dashboard")
 st.sidebar.markdown("---")
 
+# Sidebar options are independent, so fetch them together
+years, states = fetch_many([("years", None), ("states", None)])
+
 # Year selection
-years = fetch_api_data("years")
 if years:
     selected_year = st.sidebar.selectbox(
         "Select Year",
@@ -162,7 +305,6 @@ else:
     st.stop()
 
 # State selection
-states = fetch_api_data("states")
 if states:
     state_options = ["All States"] + [s["state"] for s in states]
     selected_state = st.sidebar.selectbox(
@@ -186,17 +328,24 @@ st.markdown("""
 
 # Fetch data for the selected year
 params = {"state": selected_state if selected_state != "All States" else None}
-year_data = fetch_api_data(f"eai/year/{selected_year}", params)
+year_data, counties = fetch_many([
+    (f"eai/year/{selected_year}", params),
+    ("counties", params)
+])
 
 if year_data:
     # Create and display the choropleth map
+    year_df = pd.DataFrame(year_data)
+    mapped_fips = load_mapped_fips()
     st.plotly_chart(
-        create_choropleth_map(year_data, selected_year),
+        create_choropleth_map(
+            year_df, mapped_fips, payload_digest(year_df), mapped_fips is not None,
+            selected_year, selected_state
+        ),
         use_container_width=True
     )
     
     # County selection for detailed view
-    counties = fetch_api_data("counties", params)
     if counties:
         county_options = {f"{c['name']}, {c['state']}": c['fips'] for c in counties}
         selected_county = st.selectbox(
@@ -207,46 +356,51 @@ if year_data:
         # Fetch and display county details
         county_data = fetch_api_data(f"eai/{county_options[selected_county]}")
         if county_data:
+            # Latest values and year-over-year changes in one pass
+            county_df = pd.DataFrame(county_data)
+            latest = county_df.iloc[-1]
+            delta = county_df.diff().iloc[-1]
+            
             # Create metrics row
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
                 st.metric(
                     "Current EAI Score",
-                    f"{county_data[-1]['eai_score']:.2f}",
-                    f"{county_data[-1]['eai_score'] - county_data[-2]['eai_score']:.2f}"
+                    f"{latest.eai_score:.2f}",
+                    f"{delta.eai_score:.2f}"
                 )
             
             with col2:
                 st.metric(
                     "Earned Income Share",
-                    f"{county_data[-1]['earned_share']:.1%}",
-                    f"{county_data[-1]['earned_share'] - county_data[-2]['earned_share']:.1%}"
+                    f"{latest.earned_share:.1%}",
+                    f"{delta.earned_share:.1%}"
                 )
             
             with col3:
                 st.metric(
                     "Property Income Share",
-                    f"{county_data[-1]['property_share']:.1%}",
-                    f"{county_data[-1]['property_share'] - county_data[-2]['property_share']:.1%}"
+                    f"{latest.property_share:.1%}",
+                    f"{delta.property_share:.1%}"
                 )
             
             with col4:
                 st.metric(
                     "Transfer Share",
-                    f"{county_data[-1]['transfer_share']:.1%}",
-                    f"{county_data[-1]['transfer_share'] - county_data[-2]['transfer_share']:.1%}"
+                    f"{latest.transfer_share:.1%}",
+                    f"{delta.transfer_share:.1%}"
                 )
             
             # Create and display time series
             st.plotly_chart(
-                create_time_series(county_data, selected_county),
+                create_time_series(county_df, payload_digest(county_df), selected_county),
                 use_container_width=True
             )
             
             # Download button
             if st.button("Download County Data"):
-                csv_data = pd.DataFrame(county_data).to_csv(index=False)
+                csv_data = to_csv_bytes(county_df)
                 st.download_button(
                     "Download CSV",
                     csv_data,
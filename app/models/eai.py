@@ -1,26 +1,31 @@
-from datetime import datetime
-from typing import Optional
-from sqlalchemy import Column, Integer, Float, String, Date, ForeignKey, Index
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from datetime import date, datetime
+from typing import List, Optional
+from sqlalchemy import Integer, Float, Numeric, String, Date, ForeignKey, Index, DDL, event
+from sqlalchemy.dialects.postgresql import REAL
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from geoalchemy2 import Geometry, WKBElement
 
-Base = declarative_base()
+class Base(DeclarativeBase):
+    pass
+
+# Raw dollar amounts; returned as float so API responses stay JSON-serializable
+Dollars = Numeric(14, 2, asdecimal=False)
 
 class County(Base):
     """County model for storing county information."""
     __tablename__ = "counties"
 
-    fips = Column(String(5), primary_key=True)
-    name = Column(String(100), nullable=False)
-    state = Column(String(2), nullable=False)
-    geometry = Column(String, nullable=True)  # GeoJSON string
-    centroid_lat = Column(Float, nullable=True)
-    centroid_lon = Column(Float, nullable=True)
-    created_at = Column(Date, default=datetime.utcnow)
-    updated_at = Column(Date, default=datetime.utcnow, onupdate=datetime.utcnow)
+    fips: Mapped[int] = mapped_column(Integer, primary_key=True)  # Zero-padded to 5 digits at the API edge
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    state: Mapped[str] = mapped_column(String(2), nullable=False)
+    geometry: Mapped[Optional[WKBElement]] = mapped_column(Geometry("GEOMETRY", srid=4326), nullable=True)
+    centroid_lat: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    centroid_lon: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    created_at: Mapped[Optional[date]] = mapped_column(Date, default=datetime.utcnow)
+    updated_at: Mapped[Optional[date]] = mapped_column(Date, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    eai_scores = relationship("EAIScore", back_populates="county")
+    eai_scores: Mapped[List["EAIScore"]] = relationship(back_populates="county")
 
     __table_args__ = (
         Index("idx_county_state", "state"),
@@ -31,43 +36,59 @@ class EAIScore(Base):
     """Economic Agency Index score model."""
     __tablename__ = "eai_scores"
 
-    id = Column(Integer, primary_key=True)
-    fips = Column(String(5), ForeignKey("counties.fips"), nullable=False)
-    year = Column(Integer, nullable=False)
-    earned_income = Column(Float, nullable=False)
-    property_income = Column(Float, nullable=False)
-    transfers = Column(Float, nullable=False)
-    total_income = Column(Float, nullable=False)
-    eai_score = Column(Float, nullable=False)
-    earned_share = Column(Float, nullable=False)
-    property_share = Column(Float, nullable=False)
-    transfer_share = Column(Float, nullable=False)
-    created_at = Column(Date, default=datetime.utcnow)
-    updated_at = Column(Date, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Partitioned tables need the partition key in the primary key
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    fips: Mapped[int] = mapped_column(Integer, ForeignKey("counties.fips"), nullable=False)
+    year: Mapped[int] = mapped_column(Integer, primary_key=True)
+    earned_income: Mapped[float] = mapped_column(Dollars, nullable=False)
+    property_income: Mapped[float] = mapped_column(Dollars, nullable=False)
+    transfers: Mapped[float] = mapped_column(Dollars, nullable=False)
+    total_income: Mapped[float] = mapped_column(Dollars, nullable=False)
+    # Scores and shares need no more than single precision
+    eai_score: Mapped[float] = mapped_column(REAL, nullable=False)
+    earned_share: Mapped[float] = mapped_column(REAL, nullable=False)
+    property_share: Mapped[float] = mapped_column(REAL, nullable=False)
+    transfer_share: Mapped[float] = mapped_column(REAL, nullable=False)
+    created_at: Mapped[Optional[date]] = mapped_column(Date, default=datetime.utcnow)
+    updated_at: Mapped[Optional[date]] = mapped_column(Date, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
-    county = relationship("County", back_populates="eai_scores")
+    county: Mapped["County"] = relationship(back_populates="eai_scores")
 
     __table_args__ = (
         Index("idx_eai_fips_year", "fips", "year", unique=True),
-        Index("idx_eai_year", "year"),
+        # Covers /eai/year/{year} so the map query is an index-only scan
+        Index(
+            "idx_eai_year_fips_cov", "year", "fips",
+            postgresql_include=["eai_score", "earned_share", "property_share",
+                                "transfer_share", "total_income"]
+        ),
+        # One partition per year; the pipeline creates them before loading
+        {"postgresql_partition_by": "RANGE (year)"},
     )
 
+# Catch-all partition so inserts never fail for a year without its own table
+event.listen(
+    EAIScore.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS eai_scores_default PARTITION OF eai_scores DEFAULT")
+)
+
 class DataSource(Base):
     """Model for tracking data source updates."""
     __tablename__ = "data_sources"
 
-    id = Column(Integer, primary_key=True)
-    source_name = Column(String(50), nullable=False)
-    last_update = Column(Date, nullable=False)
-    status = Column(String(20), nullable=False)  # 'success', 'failed', 'pending'
-    records_processed = Column(Integer, nullable=True)
-    error_message = Column(String(500), nullable=True)
-    created_at = Column(Date, default=datetime.utcnow)
-    updated_at = Column(Date, default=datetime.utcnow, onupdate=datetime.utcnow)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    source_name: Mapped[str] = mapped_column(String(50), nullable=False)
+    last_update: Mapped[date] = mapped_column(Date, nullable=False)
+    status: Mapped[str] = mapped_column(String(20), nullable=False)  # 'success', 'failed', 'pending'
+    records_processed: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    error_message: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    created_at: Mapped[Optional[date]] = mapped_column(Date, default=datetime.utcnow)
+    updated_at: Mapped[Optional[date]] = mapped_column(Date, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     __table_args__ = (
-        Index("idx_source_name", "source_name"),
+        Index("idx_source_name", "source_name", unique=True),
         Index("idx_source_status", "status"),
     )
 
@@ -75,19 +96,19 @@ class EAIMetadata(Base):
     """Model for storing EAI calculation metadata."""
     __tablename__ = "eai_metadata"
 
-    id = Column(Integer, primary_key=True)
-    year = Column(Integer, nullable=False)
-    calculation_date = Column(Date, nullable=False)
-    mean_earned = Column(Float, nullable=False)
-    mean_property = Column(Float, nullable=False)
-    mean_transfer = Column(Float, nullable=False)
-    std_earned = Column(Float, nullable=False)
-    std_property = Column(Float, nullable=False)
-    std_transfer = Column(Float, nullable=False)
-    total_counties = Column(Integer, nullable=False)
-    created_at = Column(Date, default=datetime.utcnow)
-    updated_at = Column(Date, default=datetime.utcnow, onupdate=datetime.utcnow)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    year: Mapped[int] = mapped_column(Integer, nullable=False)
+    calculation_date: Mapped[date] = mapped_column(Date, nullable=False)
+    mean_earned: Mapped[float] = mapped_column(Float, nullable=False)
+    mean_property: Mapped[float] = mapped_column(Float, nullable=False)
+    mean_transfer: Mapped[float] = mapped_column(Float, nullable=False)
+    std_earned: Mapped[float] = mapped_column(Float, nullable=False)
+    std_property: Mapped[float] = mapped_column(Float, nullable=False)
+    std_transfer: Mapped[float] = mapped_column(Float, nullable=False)
+    total_counties: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[Optional[date]] = mapped_column(Date, default=datetime.utcnow)
+    updated_at: Mapped[Optional[date]] = mapped_column(Date, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     __table_args__ = (
         Index("idx_metadata_year", "year", unique=True),
-    ) 
\ No newline at end of file
+    )
@@ -8,14 +8,21 @@ import os
 import sys
 import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from pathlib import Path
+from functools import lru_cache
 from datetime import datetime
 from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import yaml
 from tqdm import tqdm
 import zipfile
-import io
 
 # Add the project root to the Python path
 project_root = Path(__file__).parent.parent
@@ -23,10 +30,23 @@ sys.path.append(str(project_root))
 
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.models.eai import DataSource
 
+# Fields kept from each BEA GetData row; all are returned as strings
+BEA_FIELDS = pa.schema([
+    ("Code", pa.string()),
+    ("GeoFips", pa.string()),
+    ("GeoName", pa.string()),
+    ("TimePeriod", pa.string()),
+    ("CL_UNIT", pa.string()),
+    ("UNIT_MULT", pa.string()),
+    ("DataValue", pa.string()),
+    ("NoteRef", pa.string())
+])
+BEA_SCHEMA = BEA_FIELDS.append(pa.field("Year", pa.int16()))
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -34,6 +54,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=None)
+def load_config() -> Dict:
+    """Load config.yaml once per process."""
+    with open(project_root / "config.yaml") as f:
+        return yaml.safe_load(f)
+
 class DataDownloader:
     """Class to handle data downloads from various sources."""
     
@@ -42,23 +68,36 @@ class DataDownloader:
         load_dotenv()
         
         # Load configuration
-        config_path = project_root / "config.yaml"
-        with open(config_path) as f:
-            self.config = yaml.safe_load(f)
+        self.config = load_config()
         
         # Create necessary directories
         self.raw_dir = project_root / self.config["processing"]["raw_dir"]
         self.raw_dir.mkdir(parents=True, exist_ok=True)
         
-        # Initialize database session
-        self.engine = create_engine(self._get_database_url())
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        # Initialize database engine
+        self.engine = create_engine(
+            self._get_database_url(),
+            executemany_mode="values_plus_batch",
+            insertmanyvalues_page_size=10000,
+            executemany_batch_page_size=5000
+        )
         
         # Set up API keys and base URLs
         self.bea_api_key = os.getenv("BEA_API_KEY")
         if not self.bea_api_key:
             raise ValueError("BEA_API_KEY environment variable is required")
+        
+        # Keep-alive HTTP session shared by all downloads and worker threads
+        self.http = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=16,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+        # Retries only cover errors; a timeout stops a stalled socket hanging the run
+        self.http_timeout = tuple(self.config["data_sources"]["request_timeout"])
     
     def _get_database_url(self) -> str:
         """Get database URL from environment variables."""
@@ -74,56 +113,99 @@ class DataDownloader:
                             records_processed: Optional[int] = None,
                             error_message: Optional[str] = None):
         """Update the status of a data source in the database."""
-        source = DataSource(
+        # One row per source, updated in place
+        today = datetime.utcnow().date()
+        stmt = pg_insert(DataSource).values(
             source_name=source_name,
-            last_update=datetime.utcnow().date(),
+            last_update=today,
             status=status,
             records_processed=records_processed,
-            error_message=error_message
+            error_message=error_message,
+            created_at=today,
+            updated_at=today
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DataSource.source_name],
+            set_={
+                'last_update': stmt.excluded.last_update,
+                'status': stmt.excluded.status,
+                'records_processed': stmt.excluded.records_processed,
+                'error_message': stmt.excluded.error_message,
+                'updated_at': stmt.excluded.updated_at
+            }
         )
-        self.session.add(source)
-        self.session.commit()
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+    
+    def _fetch_bea_years(self, years: List[str]) -> List[Dict]:
+        """Fetch SAINC7 rows for a batch of years from the BEA API."""
+        base_url = self.config["data_sources"]["bea"]["base_url"]
+        table = self.config["data_sources"]["bea"]["tables"]["sainc7"]
+        params = {
+            "method": "GetData",
+            "datasetname": "RegionalIncome",
+            "TableName": table["name"],
+            "LineCode": ",".join(str(v) for v in table["lines"].values()),
+            "Year": ",".join(years),
+            "GeoFips": "COUNTY",
+            "api_key": self.bea_api_key
+        }
+        
+        response = self.http.get(base_url, params=params, timeout=self.http_timeout)
+        response.raise_for_status()
+        
+        # BEA reports request errors in a 200 response, under Results.Error
+        results = orjson.loads(response.content).get("BEAAPI", {}).get("Results")
+        if not results or "Data" not in results:
+            error = (results or {}).get("Error", "no Results.Data in response")
+            raise ValueError(f"BEA request for years {','.join(years)} failed: {error}")
+        return results["Data"]
     
     def download_bea_data(self) -> bool:
         """Download data from BEA API."""
+        # Batches are written to a partial file that only replaces the output once
+        # every batch has succeeded, so a failed run never leaves a usable-looking file
+        output_file = self.raw_dir / f"bea_sainc7_{datetime.now().strftime('%Y%m%d')}.parquet"
+        partial_file = output_file.with_suffix(".parquet.partial")
         try:
             logger.info("Downloading BEA data...")
-            base_url = self.config["data_sources"]["bea"]["base_url"]
-            table = self.config["data_sources"]["bea"]["tables"]["sainc7"]
+            bea_config = self.config["data_sources"]["bea"]
             
-            # Download data for each year
+            # Request several years per call; BEA accepts a comma-separated Year list
             start_year = self.config["processing"]["start_year"]
             current_year = self.config["processing"]["current_year"]
+            years = [str(year) for year in range(start_year, current_year + 1)]
+            batch_size = bea_config["years_per_request"]
+            year_batches = [years[i:i + batch_size] for i in range(0, len(years), batch_size)]
             
-            all_data = []
-            for year in tqdm(range(start_year, current_year + 1), desc="Downloading BEA data"):
-                params = {
-                    "method": "GetData",
-                    "datasetname": "RegionalIncome",
-                    "TableName": table["name"],
-                    "LineCode": ",".join(str(v) for v in table["lines"].values()),
-                    "Year": str(year),
-                    "GeoFips": "COUNTY",
-                    "api_key": self.bea_api_key
-                }
-                
-                response = requests.get(base_url, params=params)
-                response.raise_for_status()
-                
-                data = response.json()
-                if "BEAAPI" in data and "Results" in data["BEAAPI"]:
-                    all_data.extend(data["BEAAPI"]["Results"]["Data"])
-            
-            # Save to parquet file
-            df = pd.DataFrame(all_data)
-            output_file = self.raw_dir / f"bea_sainc7_{datetime.now().strftime('%Y%m%d')}.parquet"
-            df.to_parquet(output_file)
+            # Batches are independent; the worker count caps concurrent BEA requests.
+            # Each batch is written as it arrives, taking its year from TimePeriod
+            parquet_options = self.config["processing"]["parquet"]
+            records = 0
+            with ThreadPoolExecutor(max_workers=bea_config["max_concurrent_requests"]) as executor, \
+                    pq.ParquetWriter(
+                        partial_file,
+                        BEA_SCHEMA,
+                        compression=parquet_options["compression"],
+                        compression_level=parquet_options["compression_level"],
+                        use_dictionary=parquet_options["use_dictionary"]
+                    ) as writer:
+                futures = [executor.submit(self._fetch_bea_years, batch) for batch in year_batches]
+                for future in tqdm(as_completed(futures), total=len(futures), desc="Downloading BEA data"):
+                    batch = pa.Table.from_pylist(future.result(), schema=BEA_FIELDS)
+                    writer.write_table(
+                        batch.append_column("Year", pc.cast(batch["TimePeriod"], pa.int16())),
+                        row_group_size=parquet_options["row_group_size"]
+                    )
+                    records += batch.num_rows
+            partial_file.replace(output_file)
             
-            self._update_source_status("BEA", "success", len(df))
+            self._update_source_status("BEA", "success", records)
             logger.info(f"Successfully downloaded BEA data to {output_file}")
             return True
             
         except Exception as e:
+            partial_file.unlink(missing_ok=True)
             logger.error(f"Error downloading BEA data: {e}")
             self._update_source_status("BEA", "failed", error_message=str(e))
             return False
@@ -135,7 +217,7 @@ class DataDownloader:
             base_url = self.config["data_sources"]["irs"]["base_url"]
             
             # Download the most recent year's data
-            response = requests.get(base_url)
+            response = self.http.get(base_url, timeout=self.http_timeout)
             response.raise_for_status()
             
             # Save the Excel file
@@ -143,7 +225,18 @@ class DataDownloader:
             with open(output_file, 'wb') as f:
                 f.write(response.content)
             
-            self._update_source_status("IRS", "success")
+            # Parse the workbook once; processing reads the parquet copy
+            parquet_options = self.config["processing"]["parquet"]
+            df = pd.read_excel(output_file)
+            pq.write_table(
+                pa.Table.from_pandas(df, preserve_index=False),
+                output_file.with_suffix(".parquet"),
+                compression=parquet_options["compression"],
+                compression_level=parquet_options["compression_level"],
+                use_dictionary=parquet_options["use_dictionary"]
+            )
+            
+            self._update_source_status("IRS", "success", len(df))
             logger.info(f"Successfully downloaded IRS data to {output_file}")
             return True
             
@@ -159,12 +252,16 @@ class DataDownloader:
             base_url = self.config["data_sources"]["census"]["tiger_url"]
             shapefile = self.config["data_sources"]["census"]["shapefile"]
             
-            # Download the shapefile
-            response = requests.get(f"{base_url}/{shapefile}")
-            response.raise_for_status()
+            # Stream the shapefile archive to disk rather than holding it in memory
+            zip_path = self.raw_dir / shapefile
+            with self.http.get(f"{base_url}/{shapefile}", stream=True, timeout=self.http_timeout) as response:
+                response.raise_for_status()
+                with open(zip_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
             
             # Extract the zip file
-            with zipfile.ZipFile(io.BytesIO(response.content)) as zip_ref:
+            with zipfile.ZipFile(zip_path) as zip_ref:
                 zip_ref.extractall(self.raw_dir / "census_tiger")
             
             self._update_source_status("Census", "success")
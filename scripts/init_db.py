@@ -14,6 +14,7 @@ from datetime import datetime
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
+from psycopg2 import sql
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
@@ -43,22 +44,26 @@ def create_database():
     """Create the database if it doesn't exist."""
     load_dotenv()
     
-    # Connect to default postgres database to create new database
+    # Connect to default postgres database to create new database;
+    # CREATE DATABASE cannot run inside a transaction
     default_url = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/postgres"
-    engine = create_engine(default_url)
+    engine = create_engine(default_url, isolation_level="AUTOCOMMIT")
+    db_name = os.getenv('DB_NAME')
     
     try:
         with engine.connect() as conn:
             # Check if database exists
-            result = conn.execute(text(
-                f"SELECT 1 FROM pg_database WHERE datname = '{os.getenv('DB_NAME')}'"
-            ))
+            result = conn.execute(
+                text("SELECT 1 FROM pg_database WHERE datname = :name"),
+                {"name": db_name}
+            )
             if not result.scalar():
-                # Create database
-                conn.execute(text(f"CREATE DATABASE {os.getenv('DB_NAME')}"))
-                logger.info(f"Created database {os.getenv('DB_NAME')}")
+                # Create database; the name is quoted as an identifier
+                with conn.connection.cursor() as cursor:
+                    cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(db_name)))
+                logger.info(f"Created database {db_name}")
             else:
-                logger.info(f"Database {os.getenv('DB_NAME')} already exists")
+                logger.info(f"Database {db_name} already exists")
     except SQLAlchemyError as e:
         logger.error(f"Error creating database: {e}")
         raise
@@ -74,15 +79,15 @@ def init_database():
         # Connect to the application database
         engine = create_engine(get_database_url())
         
-        # Create all tables
-        Base.metadata.create_all(engine)
-        logger.info("Successfully created all database tables")
-        
-        # Create PostGIS extension if it doesn't exist
+        # Create PostGIS extension first; county boundaries use its geometry type
         with engine.connect() as conn:
             conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
             conn.commit()
             logger.info("PostGIS extension created or already exists")
+        
+        # Create all tables
+        Base.metadata.create_all(engine)
+        logger.info("Successfully created all database tables")
             
     except SQLAlchemyError as e:
         logger.error(f"Error initializing database: {e}")
@@ -5,18 +5,24 @@ This script processes raw data and calculates EAI scores.
 """
 
 import os
+import io
 import sys
+import json
+import time
 import logging
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from functools import lru_cache
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import yaml
 from tqdm import tqdm
 import geopandas as gpd
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import shapely
+from geoalchemy2 import WKBElement
+import redis
+from sqlalchemy import create_engine, insert, text
 
 # Add the project root to the Python path
 project_root = Path(__file__).parent.parent
@@ -32,6 +38,42 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# EAI = (earned + property - transfers) / sqrt(3), applied to component z-scores
+EAI_WEIGHTS = np.array([1.0, 1.0, -1.0]) / np.sqrt(3)
+
+def year_zscores(values: np.ndarray, year_ids: np.ndarray,
+                 n_years: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Z-score each column within its year group, skipping NaNs like pandas."""
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    n_cols = values.shape[1]
+    
+    # Per-year counts, sums and squared deviations; one bincount per column for each
+    counts = np.column_stack([
+        np.bincount(year_ids, weights=valid[:, j], minlength=n_years) for j in range(n_cols)
+    ])
+    sums = np.column_stack([
+        np.bincount(year_ids, weights=filled[:, j], minlength=n_years) for j in range(n_cols)
+    ])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        deviations = np.where(valid, values - means[year_ids], 0.0)
+        squares = np.column_stack([
+            np.bincount(year_ids, weights=deviations[:, j] ** 2, minlength=n_years)
+            for j in range(n_cols)
+        ])
+        # Sample standard deviation (ddof=1), matching pandas
+        stds = np.sqrt(np.where(counts > 1, squares / (counts - 1), np.nan))
+        zscores = np.where(valid, deviations / stds[year_ids], np.nan)
+    
+    return zscores, means, stds
+
+@lru_cache(maxsize=None)
+def load_config() -> Dict:
+    """Load config.yaml once per process."""
+    with open(project_root / "config.yaml") as f:
+        return yaml.safe_load(f)
+
 class DataProcessor:
     """Class to handle data processing and EAI calculation."""
     
@@ -40,9 +82,7 @@ class DataProcessor:
         load_dotenv()
         
         # Load configuration
-        config_path = project_root / "config.yaml"
-        with open(config_path) as f:
-            self.config = yaml.safe_load(f)
+        self.config = load_config()
         
         # Set up directories
         self.raw_dir = project_root / self.config["processing"]["raw_dir"]
@@ -52,10 +92,14 @@ class DataProcessor:
         for directory in [self.processed_dir, self.interim_dir]:
             directory.mkdir(parents=True, exist_ok=True)
         
-        # Initialize database session
-        self.engine = create_engine(self._get_database_url())
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        # Initialize database engine; executemany INSERTs are sent as
+        # multi-row VALUES pages and UPDATEs through psycopg2's execute_batch
+        self.engine = create_engine(
+            self._get_database_url(),
+            executemany_mode="values_plus_batch",
+            insertmanyvalues_page_size=10000,
+            executemany_batch_page_size=5000
+        )
     
     def _get_database_url(self) -> str:
         """Get database URL from environment variables."""
@@ -77,19 +121,31 @@ class DataProcessor:
             raise FileNotFoundError("No BEA data files found")
         
         latest_file = max(bea_files, key=lambda x: x.stat().st_mtime)
-        df = pd.read_parquet(latest_file)
+        # Only the columns the pivot uses are read off disk
+        df = pd.read_parquet(
+            latest_file,
+            columns=['GeoFips', 'Year', 'Code', 'DataValue'],
+            engine='pyarrow'
+        )
         
-        # Process the data
-        df = df.pivot_table(
+        # Cast once at ingest: BEA sends values as strings with thousands
+        # separators and "(D)"-style markers for suppressed cells
+        df['DataValue'] = pd.to_numeric(
+            df['DataValue'].str.replace(',', '', regex=False), errors='coerce'
+        ).astype('float64')
+        df['GeoFips'] = df['GeoFips'].astype('category')
+        df['Year'] = df['Year'].astype('int16')
+        
+        # Rows are unique per county, year and line, so reshape without aggregating
+        df = df.pivot(
             index=['GeoFips', 'Year'],
-            columns='LineCode',
-            values='DataValue',
-            aggfunc='first'
+            columns='Code',
+            values='DataValue'
         ).reset_index()
         
-        # Rename columns based on configuration
-        line_codes = self.config["data_sources"]["bea"]["tables"]["sainc7"]["lines"]
-        column_map = {str(v): k for k, v in line_codes.items()}
+        # Rename columns based on configuration; BEA codes lines as "<table>-<line>"
+        table = self.config["data_sources"]["bea"]["tables"]["sainc7"]
+        column_map = {f"{table['name']}-{v}": k for k, v in table["lines"].items()}
         df = df.rename(columns=column_map)
         
         return df
@@ -99,12 +155,12 @@ class DataProcessor:
         logger.info("Loading IRS data...")
         
         # Find the most recent IRS data file
-        irs_files = list(self.raw_dir.glob("irs_county_*.xlsx"))
+        irs_files = list(self.raw_dir.glob("irs_county_*.parquet"))
         if not irs_files:
             raise FileNotFoundError("No IRS data files found")
         
         latest_file = max(irs_files, key=lambda x: x.stat().st_mtime)
-        df = pd.read_excel(latest_file)
+        df = pd.read_parquet(latest_file, engine='pyarrow')
         
         # Process the data (specific processing will depend on IRS file structure)
         # This is a placeholder - adjust based on actual IRS data format
@@ -135,116 +191,184 @@ class DataProcessor:
             'STATEFP': 'state'
         })
         
-        # Calculate centroids
-        gdf['centroid_lat'] = gdf.geometry.centroid.y
-        gdf['centroid_lon'] = gdf.geometry.centroid.x
+        # Calculate centroids once in an equal-area projection, then store as lon/lat
+        centroids = gdf.geometry.to_crs(epsg=5070).centroid.to_crs(epsg=4326)
+        gdf['centroid_lat'] = centroids.y.values
+        gdf['centroid_lon'] = centroids.x.values
         
         return gdf
     
+    def simplify_geometries(self, geometries: gpd.GeoSeries) -> gpd.GeoSeries:
+        """Simplify boundaries and round coordinates for map display."""
+        tolerance = self.config["processing"]["simplify_tolerance"]
+        precision = self.config["processing"]["coordinate_precision"]
+        
+        simplified = geometries.to_crs(epsg=4326).simplify(tolerance, preserve_topology=True)
+        return gpd.GeoSeries(
+            shapely.set_precision(simplified.values, 10 ** -precision),
+            index=simplified.index,
+            crs=simplified.crs
+        )
+    
+    def save_counties_geojson(self, census_data: gpd.GeoDataFrame,
+                              boundaries: gpd.GeoSeries) -> Path:
+        """Save simplified county boundaries as GeoJSON for the dashboard map."""
+        logger.info("Saving county GeoJSON...")
+        
+        gdf = gpd.GeoDataFrame(
+            {'GeoFips': census_data['GeoFips']},
+            geometry=boundaries
+        )
+        
+        # Feature ids are the county FIPS codes the map joins on
+        output_file = self.processed_dir / self.config["processing"]["counties_geojson"]
+        output_file.write_text(gdf.set_index('GeoFips').to_json())
+        logger.info(f"Saved county GeoJSON to {output_file}")
+        
+        return output_file
+    
     def calculate_eai_scores(self, bea_data: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
         """Calculate EAI scores from BEA data."""
         logger.info("Calculating EAI scores...")
         
-        # Calculate income shares
+        # Calculate income shares in one pass over a contiguous array
         df = bea_data.copy()
-        df['total_income'] = df[['earned_income', 'property_income', 'transfers']].sum(axis=1)
-        
-        for col in ['earned_income', 'property_income', 'transfers']:
-            df[f'{col}_share'] = df[col] / df['total_income']
+        income_cols = ['earned_income', 'property_income', 'transfers']
+        incomes = df[income_cols].to_numpy(dtype=np.float64)
+        total = np.nansum(incomes, axis=1)  # suppressed (NaN) cells count as zero
+        df['total_income'] = total
+        df[[f'{col}_share' for col in income_cols]] = incomes / total[:, None]
         
-        # Calculate z-scores for each component
+        # Calculate z-scores for each component within its year
         components = ['earned_income_share', 'property_income_share', 'transfers_share']
-        metadata = {}
+        year_ids, years = pd.factorize(df['Year'])
+        zscores, means, stds = year_zscores(df[components].to_numpy(dtype=np.float64), year_ids, len(years))
+        df[[f'{col}_zscore' for col in components]] = zscores
         
-        for year in df['Year'].unique():
-            year_data = df[df['Year'] == year]
-            
-            # Calculate means and standard deviations
-            year_metadata = {
-                'mean_' + col: year_data[col].mean() for col in components
+        # Per-year metadata, keyed by the EAIMetadata column names
+        counts = np.bincount(year_ids, minlength=len(years))
+        metadata = {
+            year: {
+                'mean_earned': means[i, 0], 'mean_property': means[i, 1], 'mean_transfer': means[i, 2],
+                'std_earned': stds[i, 0], 'std_property': stds[i, 1], 'std_transfer': stds[i, 2],
+                'total_counties': int(counts[i])
             }
-            year_metadata.update({
-                'std_' + col: year_data[col].std() for col in components
-            })
-            year_metadata['total_counties'] = len(year_data)
-            
-            # Store metadata
-            metadata[year] = year_metadata
-            
-            # Calculate z-scores
-            for col in components:
-                df.loc[df['Year'] == year, f'{col}_zscore'] = (
-                    (df.loc[df['Year'] == year, col] - year_metadata[f'mean_{col}']) /
-                    year_metadata[f'std_{col}']
-                )
-        
-        # Calculate EAI score
-        df['eai_score'] = (
-            df['earned_income_share_zscore'] +
-            df['property_income_share_zscore'] -
-            df['transfers_share_zscore']
-        ) / np.sqrt(3)
+            for i, year in enumerate(years)
+        }
+        
+        # Calculate EAI score as one weighted sum over the z-score matrix
+        df['eai_score'] = zscores @ EAI_WEIGHTS
         
         return df, metadata
     
+    def create_year_partitions(self, conn, years):
+        """Create the eai_scores partition for each year if it does not exist."""
+        for year in sorted(int(year) for year in years):
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS eai_scores_{year} PARTITION OF eai_scores "
+                f"FOR VALUES FROM ({year}) TO ({year + 1})"
+            ))
+    
+    def copy_scores(self, conn, scores: pd.DataFrame):
+        """Bulk load EAI score rows with COPY on the connection's transaction."""
+        buf = io.StringIO()
+        scores.to_csv(buf, index=False, header=False, na_rep='NaN')
+        buf.seek(0)
+        
+        with conn.connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {EAIScore.__tablename__} ({', '.join(scores.columns)}) FROM STDIN WITH (FORMAT csv)",
+                buf
+            )
+    
     def save_to_database(self, eai_data: pd.DataFrame, metadata: Dict,
-                        census_data: gpd.GeoDataFrame):
+                        census_data: gpd.GeoDataFrame, boundaries: gpd.GeoSeries):
         """Save processed data to database."""
         logger.info("Saving data to database...")
         
+        # Boundaries go to PostGIS as EWKB, serialized in one vectorized call
+        geometries = shapely.set_srid(boundaries.values, 4326)
+        counties = pd.DataFrame({
+            'fips': census_data['GeoFips'].astype(int),
+            'name': census_data['name'],
+            'state': census_data['state'],
+            'geometry': [
+                WKBElement(wkb, srid=4326, extended=True)
+                for wkb in shapely.to_wkb(geometries, include_srid=True)
+            ],
+            'centroid_lat': census_data['centroid_lat'],
+            'centroid_lon': census_data['centroid_lon']
+        })
+        scores = pd.DataFrame({
+            'fips': eai_data['GeoFips'].astype(int),
+            'year': eai_data['Year'],
+            'earned_income': eai_data['earned_income'],
+            'property_income': eai_data['property_income'],
+            'transfers': eai_data['transfers'],
+            'total_income': eai_data['total_income'],
+            'eai_score': eai_data['eai_score'],
+            'earned_share': eai_data['earned_income_share'],
+            'property_share': eai_data['property_income_share'],
+            'transfer_share': eai_data['transfers_share']
+        })
+        calculation_date = datetime.utcnow().date()
+        # COPY bypasses the model's Python-side defaults
+        scores['created_at'] = calculation_date
+        scores['updated_at'] = calculation_date
+        metadata_records = [
+            {'year': int(year), 'calculation_date': calculation_date, **year_metadata}
+            for year, year_metadata in metadata.items()
+        ]
+        
         try:
-            # Save county data
-            counties = []
-            for _, row in census_data.iterrows():
-                county = County(
-                    fips=row['GeoFips'],
-                    name=row['name'],
-                    state=row['state'],
-                    geometry=row.geometry.to_json(),
-                    centroid_lat=row['centroid_lat'],
-                    centroid_lon=row['centroid_lon']
-                )
-                counties.append(county)
-            
-            self.session.bulk_save_objects(counties)
-            self.session.commit()
-            
-            # Save EAI scores
-            scores = []
-            for _, row in eai_data.iterrows():
-                score = EAIScore(
-                    fips=row['GeoFips'],
-                    year=row['Year'],
-                    earned_income=row['earned_income'],
-                    property_income=row['property_income'],
-                    transfers=row['transfers'],
-                    total_income=row['total_income'],
-                    eai_score=row['eai_score'],
-                    earned_share=row['earned_income_share'],
-                    property_share=row['property_income_share'],
-                    transfer_share=row['transfers_share']
-                )
-                scores.append(score)
+            # Every table is written in one transaction and committed once
+            with self.engine.begin() as conn:
+                conn.execute(insert(County), counties.to_dict(orient='records'))
+                
+                # Each year loads into its own partition; scores are the bulk
+                # of the data, so they go through COPY rather than INSERT
+                self.create_year_partitions(conn, scores['year'].unique())
+                self.copy_scores(conn, scores)
+                
+                conn.execute(insert(EAIMetadata), metadata_records)
             
-            self.session.bulk_save_objects(scores)
-            
-            # Save metadata
-            for year, year_metadata in metadata.items():
-                meta = EAIMetadata(
-                    year=year,
-                    calculation_date=datetime.utcnow().date(),
-                    **year_metadata
-                )
-                self.session.add(meta)
-            
-            self.session.commit()
             logger.info("Successfully saved data to database")
             
         except Exception as e:
-            self.session.rollback()
             logger.error(f"Error saving to database: {e}")
             raise
     
+    def publish_reference_data(self, eai_data: pd.DataFrame,
+                               census_data: gpd.GeoDataFrame):
+        """Publish the /states and /years lookups to Redis and clear cached API responses."""
+        logger.info("Publishing reference data to Redis...")
+        
+        keys = self.config["api"]["precomputed_keys"]
+        state_counts = census_data.groupby('state').size().sort_index()
+        states = [
+            {"state": state, "county_count": int(count)}
+            for state, count in state_counts.items()
+        ]
+        years = sorted(int(year) for year in eai_data['Year'].unique())
+        
+        client = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+        try:
+            # Responses cached before this run describe the old data
+            cache_pattern = f"{self.config['api']['response_cache_prefix']}:*"
+            stale_keys = list(client.scan_iter(match=cache_pattern, count=1000))
+            for i in range(0, len(stale_keys), 1000):
+                client.unlink(*stale_keys[i:i + 1000])
+            logger.info(f"Cleared {len(stale_keys)} cached API responses")
+            
+            # The new completion time goes out only after the cache is empty
+            client.mset({
+                keys["states"]: json.dumps(states),
+                keys["years"]: json.dumps(years),
+                keys["completed_at"]: int(time.time())
+            })
+        finally:
+            client.close()
+    
     def process_all(self) -> bool:
         """Process all data sources and calculate EAI scores."""
         try:
@@ -253,15 +377,20 @@ class DataProcessor:
             irs_data = self.load_irs_data()  # For backup if needed
             census_data = self.load_census_data()
             
+            # Simplify once; the map file and the database share the boundaries
+            boundaries = self.simplify_geometries(census_data.geometry)
+            self.save_counties_geojson(census_data, boundaries)
+            
             # Calculate EAI scores
             eai_data, metadata = self.calculate_eai_scores(bea_data)
             
             # Save to database
-            self.save_to_database(eai_data, metadata, census_data)
+            self.save_to_database(eai_data, metadata, census_data, boundaries)
+            self.publish_reference_data(eai_data, census_data)
             
             # Save processed data to parquet
             output_file = self.processed_dir / f"eai_scores_{datetime.now().strftime('%Y%m%d')}.parquet"
-            eai_data.to_parquet(output_file)
+            eai_data.to_parquet(output_file, engine='pyarrow', **self.config["processing"]["parquet"])
             logger.info(f"Saved processed data to {output_file}")
             
             return True
@@ -0,0 +1,61 @@
+"""Tests for the EAI processing helpers."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from scripts.process_data import year_zscores
+
+COLUMNS = ['earned', 'property', 'transfer']
+
+def sample_frame() -> pd.DataFrame:
+    """Years with NaN cells, a single row and a zero-variance column."""
+    return pd.DataFrame({
+        'Year': [2019, 2019, 2019, 2019, 2020, 2021, 2021, 2021],
+        'earned': [1.0, 2.0, np.nan, 4.0, 5.0, 3.0, 3.0, 3.0],
+        'property': [0.5, np.nan, 1.5, 2.5, 1.0, 2.0, 4.0, np.nan],
+        'transfer': [3.0, 1.0, 2.0, np.nan, np.nan, 1.0, 1.0, 1.0],
+    })
+
+def run_kernel(df: pd.DataFrame):
+    """Run year_zscores over the sample columns grouped by year."""
+    year_ids, years = pd.factorize(df['Year'])
+    zscores, means, stds = year_zscores(df[COLUMNS].to_numpy(dtype=float), year_ids, len(years))
+    return zscores, means, stds, years
+
+def test_zscores_match_pandas_groupby():
+    df = sample_frame()
+    zscores, _, _, _ = run_kernel(df)
+
+    grouped = df.groupby('Year')[COLUMNS]
+    expected = (df[COLUMNS] - grouped.transform('mean')) / grouped.transform('std')
+
+    assert np.allclose(zscores, expected.to_numpy(), equal_nan=True)
+
+def test_year_statistics_match_pandas_groupby():
+    df = sample_frame()
+    _, means, stds, years = run_kernel(df)
+
+    grouped = df.groupby('Year')[COLUMNS]
+    assert np.allclose(means, grouped.mean().loc[years].to_numpy(), equal_nan=True)
+    assert np.allclose(stds, grouped.std().loc[years].to_numpy(), equal_nan=True)
+
+def test_single_row_and_zero_variance_years_are_nan():
+    df = sample_frame()
+    zscores, _, stds, years = run_kernel(df)
+
+    # A one-county year has no sample standard deviation
+    single = list(years).index(2020)
+    assert np.isnan(stds[single]).all()
+    assert np.isnan(zscores[(df['Year'] == 2020).to_numpy()]).all()
+
+    # A constant column gives std 0 and NaN z-scores, as in pandas
+    constant = list(years).index(2021)
+    assert stds[constant, 0] == 0.0
+    assert np.isnan(zscores[(df['Year'] == 2021).to_numpy(), 0]).all()